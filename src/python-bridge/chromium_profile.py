@@ -0,0 +1,33 @@
+"""
+Chromium Profile Helpers
+Guards the persistent NotebookLM browser profile shared by the bridge scripts
+"""
+
+import fcntl
+from contextlib import contextmanager
+from pathlib import Path
+
+BRIDGE_DIR = Path(__file__).resolve().parent
+PROFILE_DIR = BRIDGE_DIR / ".chromium-profile"
+PROFILE_LOCK_PATH = BRIDGE_DIR / ".chromium-profile.lock"
+
+
+class ProfileBusyError(RuntimeError):
+    """Raised when another bridge process is already using the browser profile"""
+
+
+@contextmanager
+def locked_profile():
+    """Hold an exclusive lock on the browser profile for the duration of the block"""
+    with open(PROFILE_LOCK_PATH, 'w') as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise ProfileBusyError(
+                "NotebookLM browser profile is busy with another call. Try again when it finishes."
+            ) from None
+
+        try:
+            yield PROFILE_DIR
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
@@ -0,0 +1,34 @@
+"""
+JSON helpers for the Python bridge
+Uses orjson when installed and falls back to the standard library
+"""
+
+import json
+import sys
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def json_loads(data):
+    """Parse JSON from str or bytes"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def json_dumpb(obj) -> bytes:
+    """Serialize obj to UTF-8 JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode()
+
+
+def print_json(obj):
+    """Write obj to stdout as a line of UTF-8 JSON without a str round-trip"""
+    # Flush pending text output so it stays ahead of the JSON line
+    sys.stdout.flush()
+    sys.stdout.buffer.write(json_dumpb(obj) + b"\n")
+    sys.stdout.buffer.flush()
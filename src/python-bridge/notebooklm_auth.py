@@ -4,24 +4,30 @@ NotebookLM Authentication Helper
 Saves browser session state for reuse in automation
 """
 
-import json
 import sys
 import os
 from pathlib import Path
 
+from chromium_profile import PROFILE_DIR, ProfileBusyError, locked_profile
+from json_compat import json_dumpb, json_loads, print_json
+
 try:
     from playwright.sync_api import sync_playwright
 except ImportError:
-    print(json.dumps({
+    print_json({
         "success": False,
         "error": "Playwright not installed. Run: pip install playwright && playwright install chromium"
-    }))
+    })
     sys.exit(1)
 
 
+BRIDGE_DIR = Path(__file__).resolve().parent
+STATE_PATH = BRIDGE_DIR / "state.json"
+
+
 def get_state_path():
     """Get path to state.json file"""
-    return Path(__file__).parent / "state.json"
+    return STATE_PATH
 
 
 def check_auth_status():
@@ -35,24 +41,7 @@ def check_auth_status():
         }
 
     try:
-        with open(state_path, 'r') as f:
-            state = json.load(f)
-
-        # Check if we have cookies for Google
-        cookies = state.get('cookies', [])
-        google_cookies = [c for c in cookies if 'google' in c.get('domain', '')]
-
-        if google_cookies:
-            return {
-                "authenticated": True,
-                "message": "Authentication state found.",
-                "cookie_count": len(google_cookies)
-            }
-        else:
-            return {
-                "authenticated": False,
-                "message": "No Google cookies found in state. Re-authenticate."
-            }
+        return read_auth_status(state_path)
     except Exception as e:
         return {
             "authenticated": False,
@@ -60,33 +49,69 @@ def check_auth_status():
         }
 
 
-def authenticate_interactive():
-    """Launch browser for manual Google login, then save state"""
-    state_path = get_state_path()
+def read_auth_status(state_path: Path) -> dict:
+    """Parse state.json and report whether it holds Google cookies"""
+    data = state_path.read_bytes()
 
-    with sync_playwright() as p:
-        # Launch visible browser for user to log in
-        browser = p.chromium.launch(headless=False)
-        context = browser.new_context()
-        page = context.new_page()
+    # Skip the full parse when no Google domain appears anywhere in the file
+    if b'.google.' in data:
+        state = json_loads(data)
 
-        # Navigate to NotebookLM
-        page.goto('https://notebooklm.google.com/')
+        # Check if we have cookies for Google
+        cookie_count = sum(
+            1 for c in state.get('cookies', ()) if 'google' in c.get('domain', '')
+        )
 
-        print("=" * 60)
-        print("MANUAL LOGIN REQUIRED")
-        print("=" * 60)
-        print("1. Log in to your Google account in the browser window")
-        print("2. Make sure you can see the NotebookLM interface")
-        print("3. Press ENTER here when done...")
-        print("=" * 60)
+        if cookie_count:
+            return {
+                "authenticated": True,
+                "message": "Authentication state found.",
+                "cookie_count": cookie_count
+            }
+
+    return {
+        "authenticated": False,
+        "message": "No Google cookies found in state. Re-authenticate."
+    }
 
-        input()
 
-        # Save the storage state
-        context.storage_state(path=str(state_path))
+def authenticate_interactive():
+    """Launch browser for manual Google login, then save state"""
+    state_path = get_state_path()
 
-        browser.close()
+    try:
+        with locked_profile(), sync_playwright() as p:
+            # Launch visible browser on the persistent profile so the uploader
+            # reuses the same cookies directly
+            context = p.chromium.launch_persistent_context(str(PROFILE_DIR), headless=False)
+            page = context.pages[0] if context.pages else context.new_page()
+
+            # Navigate to NotebookLM
+            page.goto('https://notebooklm.google.com/')
+
+            print("=" * 60)
+            print("MANUAL LOGIN REQUIRED")
+            print("=" * 60)
+            print("1. Log in to your Google account in the browser window")
+            print("2. Make sure you can see the NotebookLM interface")
+            print("3. Press ENTER here when done...")
+            print("=" * 60)
+
+            input()
+
+            # Save the storage state for status checks, serialized the same way the
+            # uploader compares it so the next upload does not rewrite an unchanged file
+            tmp_path = state_path.with_suffix('.json.tmp')
+            tmp_path.write_bytes(json_dumpb(context.storage_state()))
+            os.replace(tmp_path, state_path)
+
+            context.close()
+
+    except ProfileBusyError as e:
+        return {
+            "success": False,
+            "message": str(e)
+        }
 
     return {
         "success": True,
@@ -97,7 +122,7 @@ def authenticate_interactive():
 
 def main():
     if len(sys.argv) < 2:
-        print(json.dumps({"error": "Usage: notebooklm_auth.py <check|authenticate>"}))
+        print_json({"error": "Usage: notebooklm_auth.py <check|authenticate>"})
         sys.exit(1)
 
     action = sys.argv[1]
@@ -109,7 +134,7 @@ def main():
     else:
         result = {"error": f"Unknown action: {action}"}
 
-    print(json.dumps(result))
+    print_json(result)
 
 
 if __name__ == "__main__":
@@ -4,70 +4,135 @@ NotebookLM Source Upload Automation
 Uses Playwright to automate adding sources to NotebookLM notebooks
 """
 
-import json
 import sys
 import os
-import time
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, List, Optional
+
+from chromium_profile import PROFILE_DIR, locked_profile
+from json_compat import json_dumpb, json_loads, print_json
 
 try:
     from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeout
 except ImportError:
-    print(json.dumps({
+    print_json({
         "success": False,
         "error": "Playwright not installed. Run: pip install playwright && playwright install chromium"
-    }))
+    })
     sys.exit(1)
 
 
-STATE_PATH = Path(__file__).parent / "state.json"
+BRIDGE_DIR = Path(__file__).resolve().parent
+STATE_PATH = BRIDGE_DIR / "state.json"
 NOTEBOOKLM_URL = "https://notebooklm.google.com/"
 
+# Selectors; test-id alternatives are listed before text matches by convention, for readability only
+# (a selector list is matched as a whole and .first picks by DOM order)
+SEL_ADD_SRC_TEST_ID = '[data-test-id="add-source-button"]'
+SEL_ADD_SRC_TEXT = 'button:has-text("Add source")'
+SEL_WEBSITE_OPTION = '[data-test-id="source-type-website"], button:has-text("Website")'
+SEL_UPLOAD_OPTION = '[data-test-id="source-type-upload"], button:has-text("Upload")'
+SEL_URL_INPUT = '[data-test-id="website-url-input"], input[type="url"], input[placeholder*="URL"]'
+SEL_FILE_INPUT = 'input[type="file"]'
+SEL_SOURCE_ROW = '[data-test-id="source-row"]'
+SEL_SOURCE_READY = f'{SEL_SOURCE_ROW}[data-state="ready"]'
+SEL_SOURCE_TITLE = '[data-test-id="source-title"]'
+SEL_CREATE_NB = '[data-test-id="create-notebook-button"], button:has-text("Create new")'
+SEL_NAME_INPUT = 'input[placeholder*="name"]'
+SEL_NB_EDITOR = '[data-test-id="notebook-editor"]'
+SEL_NB_CARD = '[data-test-id="notebook-card"]'
+SEL_NB_TITLE = '[data-test-id="notebook-title"]'
+SEL_EMPTY_STATE = '[data-test-id="empty-state"]'
+
+# Combined selectors, built from the ones above so they never drift
+SEL_ADD_SRC = f'{SEL_ADD_SRC_TEST_ID}, {SEL_ADD_SRC_TEXT}'
+SEL_ADD_SRC_READY = (
+    f'{SEL_ADD_SRC_TEST_ID}:not([aria-disabled="true"]), '
+    f'{SEL_ADD_SRC_TEXT}:not([aria-disabled="true"])'
+)
+SEL_UPLOAD_OR_FILE_INPUT = f'{SEL_UPLOAD_OPTION}, {SEL_FILE_INPUT}'
+SEL_NB_LANDING = f'{SEL_NB_CARD}, {SEL_CREATE_NB}'
+SEL_NB_CARD_OR_EMPTY = f'{SEL_NB_CARD}, {SEL_EMPTY_STATE}'
+SEL_NAME_OR_EDITOR = f'{SEL_NAME_INPUT}, {SEL_NB_EDITOR}'
+
+# Maps notebook cards to their titles in-page; takes the title selector as its argument
+NOTEBOOK_TITLES_JS = (
+    "(els, sel) => els.map(c => (c.querySelector(sel)?.innerText) || 'Untitled')"
+)
+
+# Titles of ready source rows from index n onward; takes [n, title selector] as its argument
+NEW_READY_TITLES_JS = (
+    "(els, [n, sel]) => els.slice(n).filter(e => e.dataset.state === 'ready')"
+    ".map(e => (e.querySelector(sel) || e).innerText.trim())"
+)
+
+
+def save_state_if_changed(context):
+    """Write the context's session state to state.json only when it differs from the file on disk"""
+    try:
+        data = json_dumpb(context.storage_state())
+
+        if STATE_PATH.exists() and STATE_PATH.read_bytes() == data:
+            return
+
+        # Replace atomically so a concurrent status check never sees a partial file
+        tmp_path = STATE_PATH.with_suffix('.json.tmp')
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, STATE_PATH)
+    except Exception as e:
+        print(f"Error saving state: {e}", file=sys.stderr)
+
+
+def launch_context(p, headless: bool = True):
+    """Launch the persistent Chromium profile, seeding it from state.json on first use"""
+    first_run = not PROFILE_DIR.exists() or not any(PROFILE_DIR.iterdir())
+    context = p.chromium.launch_persistent_context(str(PROFILE_DIR), headless=headless)
+
+    if first_run and STATE_PATH.exists():
+        # Migrate cookies from a state.json saved before the profile existed
+        context.add_cookies(json_loads(STATE_PATH.read_bytes()).get('cookies', []))
+
+    return context
+
+
+def open_notebooklm(page):
+    """Navigate to NotebookLM and wait until the notebook list is interactable"""
+    page.goto(NOTEBOOKLM_URL, wait_until='domcontentloaded')
+    page.locator(SEL_NB_LANDING).first.wait_for(timeout=15000)
+
 
 def get_notebooks(page) -> List[dict]:
     """Get list of existing notebooks"""
-    notebooks = []
-
     try:
-        # Wait for notebook list to load
-        page.wait_for_selector('[data-test-id="notebook-card"]', timeout=10000)
-
-        # Get all notebook cards
-        cards = page.query_selector_all('[data-test-id="notebook-card"]')
-
-        for card in cards:
-            title_el = card.query_selector('[data-test-id="notebook-title"]')
-            title = title_el.inner_text() if title_el else "Untitled"
-            notebooks.append({
-                "title": title,
-                "element": card
-            })
+        # Wait for cards or the empty state, whichever renders first
+        page.locator(SEL_NB_CARD_OR_EMPTY).first.wait_for(timeout=10000)
     except PlaywrightTimeout:
-        # No notebooks found or page structure different
-        pass
+        # Page structure different
+        return []
 
-    return notebooks
+    # Extract all titles in-page with a single round-trip; empty when no cards exist
+    titles = page.eval_on_selector_all(SEL_NB_CARD, NOTEBOOK_TITLES_JS, SEL_NB_TITLE)
+    return [{"title": t, "index": i} for i, t in enumerate(titles)]
 
 
 def create_notebook(page, name: str) -> bool:
     """Create a new notebook"""
     try:
         # Click create new notebook button
-        create_btn = page.query_selector('button:has-text("Create new")')
-        if not create_btn:
-            create_btn = page.query_selector('[data-test-id="create-notebook-button"]')
+        create_btn = page.locator(SEL_CREATE_NB).first
 
-        if create_btn:
+        if create_btn.count():
             create_btn.click()
-            time.sleep(2)
+
+            # Wait for either the name prompt or the new notebook editor
+            page.locator(SEL_NAME_OR_EDITOR).first.wait_for(timeout=10000)
 
             # Enter notebook name if prompted
-            name_input = page.query_selector('input[placeholder*="name"]')
-            if name_input:
+            name_input = page.locator(SEL_NAME_INPUT).first
+            if name_input.count():
                 name_input.fill(name)
                 name_input.press('Enter')
-                time.sleep(1)
+                page.locator(SEL_NB_EDITOR).first.wait_for(timeout=10000)
 
             return True
     except Exception as e:
@@ -76,44 +141,85 @@ def create_notebook(page, name: str) -> bool:
     return False
 
 
-def add_website_source(page, url: str) -> dict:
-    """Add a website URL as a source"""
+def wait_until_ready(page, selector: str):
+    """Wait briefly for the UI to accept the next source; the next add retries anyway"""
     try:
-        # Click add source button
-        add_btn = page.query_selector('button:has-text("Add source")')
-        if not add_btn:
-            add_btn = page.query_selector('[data-test-id="add-source-button"]')
+        page.locator(selector).first.wait_for(state="visible", timeout=3000)
+    except PlaywrightTimeout:
+        pass
 
-        if not add_btn:
-            return {"success": False, "error": "Could not find Add Source button"}
 
-        add_btn.click()
-        time.sleep(1)
+def ensure_source_dialog(page, kind: str) -> Optional[str]:
+    """
+    Open the Add Source dialog for a 'website' or 'file' source unless it is already open
 
-        # Select website option
-        website_option = page.query_selector('button:has-text("Website")')
-        if not website_option:
-            website_option = page.query_selector('[data-test-id="source-type-website"]')
+    Returns an error message if the dialog could not be opened.
+    """
+    if kind == 'website':
+        # Reuse the website panel if it is still open from a previous source
+        source_input = page.locator(SEL_URL_INPUT).first
+        if source_input.is_visible():
+            return None
+    else:
+        # The hidden file input is often already in the DOM; use it directly
+        source_input = page.locator(SEL_FILE_INPUT).first
+        if source_input.count() or page.locator(SEL_UPLOAD_OPTION).first.is_visible():
+            return None
+
+    # Click add source button
+    add_btn = page.locator(SEL_ADD_SRC).first
+
+    if not add_btn.count():
+        return "Could not find Add Source button"
 
-        if not website_option:
-            return {"success": False, "error": "Could not find Website option"}
+    add_btn.click()
+
+    if kind == 'website':
+        # Select website option
+        website_option = page.locator(SEL_WEBSITE_OPTION).first
+        try:
+            website_option.wait_for(state="visible", timeout=5000)
+        except PlaywrightTimeout:
+            return "Could not find Website option"
 
         website_option.click()
-        time.sleep(0.5)
 
-        # Enter URL
-        url_input = page.query_selector('input[type="url"], input[placeholder*="URL"]')
-        if not url_input:
-            url_input = page.query_selector('[data-test-id="website-url-input"]')
+        try:
+            source_input.wait_for(state="visible", timeout=5000)
+        except PlaywrightTimeout:
+            return "Could not find URL input"
+    else:
+        # Some layouts expose the file input without an Upload option
+        try:
+            page.locator(SEL_UPLOAD_OR_FILE_INPUT).first.wait_for(
+                state="attached", timeout=5000
+            )
+        except PlaywrightTimeout:
+            return "Could not find file upload option"
+
+    return None
 
-        if not url_input:
-            return {"success": False, "error": "Could not find URL input"}
 
+def add_website_source(page, url: str) -> dict:
+    """Add a website URL as a source"""
+    try:
+        error = ensure_source_dialog(page, 'website')
+        if error:
+            return {"success": False, "error": error}
+
+        source_rows = page.locator(SEL_SOURCE_ROW)
+        row_count = source_rows.count()
+
+        # Enter URL
+        url_input = page.locator(SEL_URL_INPUT).first
         url_input.fill(url)
         url_input.press('Enter')
 
-        # Wait for source to be added
-        time.sleep(3)
+        # Wait for a new source row; the URL input stays visible, so it proves nothing
+        try:
+            source_rows.nth(row_count).wait_for(state="attached", timeout=30000)
+        except PlaywrightTimeout:
+            return {"success": False, "error": "Source was not added within 30 seconds"}
 
         return {"success": True, "url": url}
 
@@ -121,43 +227,140 @@ def add_website_source(page, url: str) -> dict:
         return {"success": False, "error": str(e)}
 
 
-def add_file_source(page, file_path: str) -> dict:
-    """Add a file as a source (PDF, TXT, etc.)"""
+def set_source_files(page, file_paths: List[str]):
+    """Hand files to an attached file input, or to the chooser raised by the Upload option"""
+    file_input = page.locator(SEL_FILE_INPUT).first
+
+    if file_input.count():
+        accepts_many = file_input.get_attribute('multiple') is not None
+        set_files = file_input.set_input_files
+    else:
+        with page.expect_file_chooser(timeout=5000) as fc_info:
+            page.locator(SEL_UPLOAD_OPTION).first.click()
+        chooser = fc_info.value
+        accepts_many = chooser.is_multiple()
+        set_files = chooser.set_files
+
+    if len(file_paths) == 1 or accepts_many:
+        set_files(file_paths)
+        return
+
+    # Target only takes one file at a time; feed the rest through the dialog again
+    set_files(file_paths[0])
+    for file_path in file_paths[1:]:
+        error = ensure_source_dialog(page, 'file')
+        if error:
+            raise RuntimeError(error)
+        set_source_files(page, [file_path])
+
+
+def start_file_sources(page, file_paths: List[str]) -> dict:
+    """
+    Hand several files (PDF, TXT, etc.) to a single upload dialog without waiting for processing
+
+    Returns the batch state for finish_file_sources, with 'results' already set
+    if the upload could not start.
+    """
     try:
-        if not os.path.exists(file_path):
-            return {"success": False, "error": f"File not found: {file_path}"}
-
-        # Click add source button
-        add_btn = page.query_selector('button:has-text("Add source")')
-        if not add_btn:
-            add_btn = page.query_selector('[data-test-id="add-source-button"]')
-
-        if not add_btn:
-            return {"success": False, "error": "Could not find Add Source button"}
-
-        add_btn.click()
-        time.sleep(1)
-
-        # Select file upload option
-        file_option = page.query_selector('button:has-text("Upload")')
-        if not file_option:
-            file_option = page.query_selector('[data-test-id="source-type-upload"]')
-
-        if file_option:
-            file_option.click()
-            time.sleep(0.5)
-
-        # Handle file input
-        file_input = page.query_selector('input[type="file"]')
-        if file_input:
-            file_input.set_input_files(file_path)
-            time.sleep(5)  # Wait for upload
-            return {"success": True, "file": file_path}
-        else:
-            return {"success": False, "error": "Could not find file input"}
+        error = ensure_source_dialog(page, 'file')
+        if error:
+            return {"results": {path: {"success": False, "error": error} for path in file_paths}}
+
+        source_rows = page.locator(SEL_SOURCE_ROW)
+        batch = {
+            "row_count": source_rows.count(),
+            "ready_count": page.locator(SEL_SOURCE_READY).count(),
+            "overlap": True
+        }
+
+        set_source_files(page, file_paths)
+
+        # Later sources can only be told apart once every file has its row
+        try:
+            source_rows.nth(batch["row_count"] + len(file_paths) - 1).wait_for(
+                state="attached", timeout=10000
+            )
+        except PlaywrightTimeout:
+            batch["overlap"] = False
+
+        return batch
 
     except Exception as e:
-        return {"success": False, "error": str(e)}
+        return {"results": {path: {"success": False, "error": str(e)} for path in file_paths}}
+
+
+def finish_file_sources(page, file_paths: List[str], batch: dict, other_sources: int = 0) -> Dict[str, dict]:
+    """
+    Wait for a started file batch to finish processing
+
+    other_sources counts sources added since the batch started, since their
+    ready rows count towards the wait too. Returns a result dict for each file path.
+    """
+    if "results" in batch:
+        return batch["results"]
+
+    try:
+        # Wait for at least one new ready row per source; an exact count breaks
+        # when an older row finishes processing during the wait
+        try:
+            page.locator(SEL_SOURCE_READY).nth(
+                batch["ready_count"] + len(file_paths) + other_sources - 1
+            ).wait_for(state="attached", timeout=60000)
+            wait_until_ready(page, SEL_ADD_SRC_READY)
+            return {path: {"success": True, "file": path} for path in file_paths}
+        except PlaywrightTimeout:
+            pass
+
+        # Not every upload finished; credit only files named by a ready row this batch added
+        ready_titles = set(page.eval_on_selector_all(
+            SEL_SOURCE_ROW, NEW_READY_TITLES_JS, [batch["row_count"], SEL_SOURCE_TITLE]
+        ))
+        file_results = {}
+        for path in file_paths:
+            if Path(path).name in ready_titles:
+                file_results[path] = {"success": True, "file": path}
+            else:
+                file_results[path] = {"success": False, "error": "Upload did not finish within 60 seconds"}
+        return file_results
+
+    except Exception as e:
+        return {path: {"success": False, "error": str(e)} for path in file_paths}
+
+
+def partition_sources(sources: List[dict], outcomes: Dict[int, dict]):
+    """
+    Split source indexes into website and file groups so files can share one upload dialog
+
+    Missing files and unknown source types are recorded as failed outcomes.
+    """
+    website_indexes = []
+    file_indexes = []
+    for index, source in enumerate(sources):
+        source_type = source.get('type', 'website')
+        value = source.get('value', '')
+
+        if source_type == 'website':
+            website_indexes.append(index)
+        elif source_type == 'file':
+            if Path(value).is_file():
+                file_indexes.append(index)
+            else:
+                outcomes[index] = {"success": False, "error": f"File not found: {value}"}
+        else:
+            outcomes[index] = {"success": False, "error": f"Unknown source type: {source_type}"}
+
+    return website_indexes, file_indexes
+
+
+def record_result(results: dict, value: str, result: dict):
+    """Record a single source outcome in the upload results"""
+    if result.get('success'):
+        results['uploaded'].append(value)
+    else:
+        results['failed'].append({
+            "value": value,
+            "error": result.get('error', 'Unknown error')
+        })
 
 
 def upload_sources(notebook_name: str, sources: List[dict], headless: bool = True) -> dict:
@@ -179,68 +382,64 @@ def upload_sources(notebook_name: str, sources: List[dict], headless: bool = Tru
         "failed": []
     }
 
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=headless)
-        context = browser.new_context(storage_state=str(STATE_PATH))
-        page = context.new_page()
+    values = [source.get('value', '') for source in sources]
+    outcomes: Dict[int, dict] = {}
+    website_indexes, file_indexes = partition_sources(sources, outcomes)
 
-        try:
-            # Navigate to NotebookLM
-            page.goto(NOTEBOOKLM_URL)
-            page.wait_for_load_state('networkidle')
-            time.sleep(2)
-
-            # Find or create notebook
-            notebooks = get_notebooks(page)
-            target_notebook = None
-
-            for nb in notebooks:
-                if nb['title'].lower() == notebook_name.lower():
-                    target_notebook = nb
-                    break
-
-            if target_notebook:
-                # Click on existing notebook
-                target_notebook['element'].click()
-                time.sleep(2)
-            else:
-                # Create new notebook
-                if not create_notebook(page, notebook_name):
-                    results["success"] = False
-                    results["error"] = "Could not create notebook"
-                    return results
-
-            # Add each source
-            for source in sources:
-                source_type = source.get('type', 'website')
-                value = source.get('value', '')
-
-                if source_type == 'website':
-                    result = add_website_source(page, value)
-                elif source_type == 'file':
-                    result = add_file_source(page, value)
-                else:
-                    result = {"success": False, "error": f"Unknown source type: {source_type}"}
-
-                if result.get('success'):
-                    results['uploaded'].append(value)
-                else:
-                    results['failed'].append({
-                        "value": value,
-                        "error": result.get('error', 'Unknown error')
-                    })
-
-                # Small delay between sources
-                time.sleep(1)
-
-        except Exception as e:
-            results["success"] = False
-            results["error"] = str(e)
-
-        finally:
-            # Save updated state
-            context.storage_state(path=str(STATE_PATH))
-            browser.close()
+    try:
+        with locked_profile(), sync_playwright() as p:
+            context = launch_context(p, headless=headless)
+            try:
+                page = context.pages[0] if context.pages else context.new_page()
+
+                # Navigate to NotebookLM
+                open_notebooklm(page)
+
+                # Find or create notebook
+                notebooks = get_notebooks(page)
+
+                # Reversed so the first card wins when titles collide
+                by_name = {nb['title'].lower(): nb for nb in reversed(notebooks)}
+                target_notebook = by_name.get(notebook_name.lower())
+
+                if target_notebook:
+                    # Click on existing notebook, re-resolving the card by index
+                    page.locator(SEL_NB_CARD).nth(target_notebook['index']).click()
+                    page.locator(SEL_NB_EDITOR).first.wait_for(timeout=10000)
+                elif not create_notebook(page, notebook_name):
+                    raise RuntimeError("Could not create notebook")
+
+                # Start all file sources in one batch so they process while websites are added
+                file_paths = [values[index] for index in file_indexes]
+                file_results = {}
+                if file_paths:
+                    batch = start_file_sources(page, file_paths)
+                    # A late file row would pass for a website, so finish the files first
+                    if not batch.get("overlap"):
+                        file_results = finish_file_sources(page, file_paths, batch)
+
+                # Add each website source
+                websites_added = 0
+                for index in website_indexes:
+                    outcomes[index] = add_website_source(page, values[index])
+                    websites_added += bool(outcomes[index].get('success'))
+
+                if file_paths and not file_results:
+                    file_results = finish_file_sources(page, file_paths, batch, websites_added)
+                for index in file_indexes:
+                    outcomes[index] = file_results[values[index]]
+
+            finally:
+                save_state_if_changed(context)
+                context.close()
+
+    except Exception as e:
+        results["success"] = False
+        results["error"] = str(e)
+
+    # Report outcomes in the order the sources were given
+    for index in sorted(outcomes):
+        record_result(results, values[index], outcomes[index])
 
     return results
 
@@ -253,40 +452,39 @@ def list_notebooks(headless: bool = True) -> dict:
             "error": "Not authenticated. Run authentication first."
         }
 
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=headless)
-        context = browser.new_context(storage_state=str(STATE_PATH))
-        page = context.new_page()
+    try:
+        with locked_profile(), sync_playwright() as p:
+            context = launch_context(p, headless=headless)
+            try:
+                page = context.pages[0] if context.pages else context.new_page()
 
-        try:
-            page.goto(NOTEBOOKLM_URL)
-            page.wait_for_load_state('networkidle')
-            time.sleep(3)
+                # Navigate to NotebookLM
+                open_notebooklm(page)
 
-            notebooks = get_notebooks(page)
-            titles = [nb['title'] for nb in notebooks]
+                notebooks = get_notebooks(page)
+                titles = [nb['title'] for nb in notebooks]
 
-            return {
-                "success": True,
-                "notebooks": titles,
-                "count": len(titles)
-            }
+                return {
+                    "success": True,
+                    "notebooks": titles,
+                    "count": len(titles)
+                }
 
-        except Exception as e:
-            return {
-                "success": False,
-                "error": str(e)
-            }
+            finally:
+                context.close()
 
-        finally:
-            browser.close()
+    except Exception as e:
+        return {
+            "success": False,
+            "error": str(e)
+        }
 
 
 def main():
     if len(sys.argv) < 2:
-        print(json.dumps({
+        print_json({
             "error": "Usage: notebooklm_upload.py <list|upload> [args...]"
-        }))
+        })
         sys.exit(1)
 
     action = sys.argv[1]
@@ -296,31 +494,39 @@ def main():
 
     elif action == "upload":
         if len(sys.argv) < 4:
-            print(json.dumps({
+            print_json({
                 "error": "Usage: notebooklm_upload.py upload <notebook_name> <sources_json>"
-            }))
+            })
             sys.exit(1)
 
         notebook_name = sys.argv[2]
         sources_json = sys.argv[3]
 
         try:
-            sources = json.loads(sources_json)
-        except json.JSONDecodeError:
-            # Try reading from file
-            if os.path.exists(sources_json):
-                with open(sources_json, 'r') as f:
-                    sources = json.load(f)
+            if sources_json.lstrip().startswith(('{', '[')):
+                sources = json_loads(sources_json)
+            elif Path(sources_json).is_file():
+                # Read sources from file
+                with open(sources_json, 'rb') as f:
+                    sources = json_loads(f.read())
             else:
-                print(json.dumps({"error": "Invalid sources JSON"}))
-                sys.exit(1)
+                raise ValueError(sources_json)
+
+            # Accept a single source object; anything else must be a list of objects
+            if isinstance(sources, dict):
+                sources = [sources]
+            if not isinstance(sources, list) or not all(isinstance(s, dict) for s in sources):
+                raise ValueError(sources_json)
+        except ValueError:
+            print_json({"error": "Invalid sources JSON"})
+            sys.exit(1)
 
         result = upload_sources(notebook_name, sources, headless=True)
 
     else:
         result = {"error": f"Unknown action: {action}"}
 
-    print(json.dumps(result))
+    print_json(result)
 
 
 if __name__ == "__main__":
@@ -32,6 +32,10 @@ async function executePythonScript(
     let stdout = '';
     let stderr = '';
 
+    // Decode as UTF-8 streams so multibyte characters split across chunks survive
+    pythonProcess.stdout.setEncoding('utf8');
+    pythonProcess.stderr.setEncoding('utf8');
+
     pythonProcess.stdout.on('data', (data) => {
       stdout += data.toString();
     });